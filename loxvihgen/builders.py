@@ -1,11 +1,12 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Sequence, Tuple
-from .core import Path, PathToken, ObjKey, ArrIdx
+from typing import Dict, List, Optional, Sequence, Tuple
+from .core import Path, PathToken, ArrIdx
 from .rules import Rules
+from .sources import max_decimals_by_signature
 
-@dataclass
+@dataclass(slots=True)
 class Command:
     title: str
     check: str
@@ -16,28 +17,63 @@ class TitleBuilder:
         self.sep = sep
         self.prefix = prefix
         self.width = width_by_key
+        # "key[NN]" labels, formatted once per array token from a per-key
+        # "%0Nd" pattern
+        self._labels: Dict[ArrIdx, str] = {}
+        self._label_fmts: Dict[str, str] = {}
 
     def for_path(self, path: Path) -> str:
+        labels = self._labels
         parts: List[str] = []
         for t in path.tokens:
-            if isinstance(t, ArrIdx):
-                w = self.width.get(t.key, 1)
-                parts.append(f"{t.key}[{t.idx:0{w}d}]")
+            if type(t) is ArrIdx:
+                label = labels.get(t)
+                if label is None:
+                    fmt = self._label_fmts.get(t.key)
+                    if fmt is None:
+                        w = self.width.get(t.key, 1)
+                        fmt = self._label_fmts[t.key] = f"{t.key.replace('%', '%%')}[%0{w}d]"
+                    label = labels[t] = fmt % t.idx
+                parts.append(label)
             else:
                 parts.append(t.key)
         base = self.sep.join(parts)
         return (f"{self.prefix}{self.sep}{base}" if self.prefix and base else (self.prefix or base))
 
 class CheckStringBuilder:
+    def __init__(self) -> None:
+        # keys repeat across array rows; build each fragment once, keyed by
+        # the (hashable, interned) token itself
+        self._parts: Dict[PathToken, str] = {}
+        # tokens above the previous leaf's parent and their joined fragments
+        self._last_outer: Sequence[PathToken] = ()
+        self._last_prefix = ""
+
     def build(self, path: Path) -> str:
-        parts: List[str] = []
-        for t in path.tokens:
-            if isinstance(t, ObjKey):
-                parts.append(self._for_obj(t.key))
-            elif isinstance(t, ArrIdx):
-                parts.append(self._for_arr(t.key, t.idx))
-        parts.append("\\v")
-        return "".join(parts)
+        tokens = path.tokens
+        if not tokens:
+            return "\\v"
+        cache = self._parts
+        try:
+            if len(tokens) == 1:
+                return cache[tokens[0]] + "\\v"
+            # Leaves arrive in document order: siblings follow each other, and
+            # so do the rows of an array, whose parents differ only in their
+            # last (index) token. Reuse the joined prefix above the parent.
+            outer = tokens[:-2]
+            if outer != self._last_outer:
+                self._last_prefix = "".join([cache[t] for t in outer])
+                self._last_outer = outer
+            return self._last_prefix + cache[tokens[-2]] + cache[tokens[-1]] + "\\v"
+        except KeyError:
+            pass
+        for t in tokens:
+            if t not in cache:
+                if type(t) is ArrIdx:
+                    cache[t] = self._for_arr(t.key, t.idx)
+                else:
+                    cache[t] = self._for_obj(t.key)
+        return self.build(path)
 
     def _for_obj(self, key: str) -> str:
         raise NotImplementedError
@@ -46,6 +82,12 @@ class CheckStringBuilder:
         raise NotImplementedError
 
 class JSONCheckStringBuilder(CheckStringBuilder):
+    def __init__(self) -> None:
+        super().__init__()
+        # _braces[n] == "\\i{\\i" * n, shared by all array keys and grown
+        # one step at a time instead of re-multiplied per element
+        self._braces: List[str] = [""]
+
     def _for_obj(self, key: str) -> str:
         i = "\\i"
         return f"{i}&quot;{key}&quot;:{i}"
@@ -56,7 +98,10 @@ class JSONCheckStringBuilder(CheckStringBuilder):
             start = "\\i[" + i
         else:
             start = f"{i}&quot;{key}&quot;:[{i}"
-        return start + "\\i{\\i" * (idx + 1)
+        braces = self._braces
+        while len(braces) <= idx + 1:
+            braces.append(braces[-1] + "\\i{\\i")
+        return start + braces[idx + 1]
 
 class XMLCheckStringBuilder(CheckStringBuilder):
     def _for_obj(self, key: str) -> str:
@@ -75,39 +120,50 @@ class VIHBuilder:
         self.check_builder = check_builder
 
     @staticmethod
-    def _signature(tokens: Sequence[PathToken]) -> Tuple[str, ...]:
-        sig: List[str] = []
-        for t in tokens:
-            if isinstance(t, ArrIdx):
-                if t.key != "$root":
-                    sig.append(f"{t.key}[]")
-            else:
-                sig.append(t.key)
-        return tuple(sig)
-
-    def _format_for(self, tokens: Sequence[PathToken], decimals_by_sig: Dict[Tuple[str, ...], int]) -> str:
-        u = self.rules.match_unit(tokens)
+    def _format_for(u: Optional[Tuple[str, bool]], d: int) -> str:
         if u and u[1]:
             return u[0]
-        sig = VIHBuilder._signature(tokens)
-        d = max(0, decimals_by_sig.get(sig, 0))
-        base = "<v>" if d == 0 else f"<v.{d}>"
-        if u and not u[1]:
+        base = "<v>" if d <= 0 else f"<v.{d}>"
+        if u:
             return f"{base} {u[0]}"
         return base
 
     def build_commands(self) -> List[Command]:
-        widths = self.source.index_widths()
-        leaves = list(self.source.iter_numeric_leaves())
-        # aggregate decimals per signature across arrays
-        decs: Dict[Tuple[str, ...], int] = {}
-        for p, _v, d in leaves:
-            sig = VIHBuilder._signature(p.tokens)
-            decs[sig] = max(decs.get(sig, 0), d)
+        get_decs = getattr(self.source, "decimals_by_signature", None)
+        if get_decs is not None:
+            decs = get_decs()
+            leaves = self.source.iter_numeric_leaves()
+        else:
+            # sources that only provide iter_numeric_leaves/index_widths may
+            # not be iterable twice: aggregate from the same leaf list
+            leaves = list(self.source.iter_numeric_leaves())
+            decs = max_decimals_by_signature(leaves)
+        # Decimals depend on the signature and the unit rule on the token
+        # keys; array rows share both, and so one format string. An object
+        # key "k[]" and an array "k" share a signature but may match rules
+        # differently, so with rules each signature caches one format per
+        # matched rule (the trie hands back the same tuple for each hit).
+        fmt_by_sig: Dict[Tuple[str, ...], str] = {}
+        fmt_by_rule: Dict[Tuple[str, ...], Dict[Optional[Tuple[str, bool]], str]] = {}
+        match_unit = self.rules.match_unit if self.rules.rules else None
+        # bound once: this loop runs per leaf
+        for_path = self.title_builder.for_path
+        build_check = self.check_builder.build
         out: List[Command] = []
+        append = out.append
         for p, _v, _d in leaves:
-            title = self.title_builder.for_path(p)
-            check = self.check_builder.build(p)
-            unit = self._format_for(p.tokens, decs)
-            out.append(Command(title=title, check=check, unit=unit))
+            sig = p.signature()
+            if match_unit is None:
+                unit = fmt_by_sig.get(sig)
+                if unit is None:
+                    unit = fmt_by_sig[sig] = self._format_for(None, decs.get(sig, 0))
+            else:
+                u = match_unit(p.tokens)
+                per_rule = fmt_by_rule.get(sig)
+                if per_rule is None:
+                    per_rule = fmt_by_rule[sig] = {}
+                unit = per_rule.get(u)
+                if unit is None:
+                    unit = per_rule[u] = self._format_for(u, decs.get(sig, 0))
+            append(Command(for_path(p), build_check(p), unit))
         return out
@@ -6,6 +6,12 @@ from pathlib import Path
 from typing import Optional, Sequence
 from .service import cmd_fetch, cmd_rules, cmd_build, cmd_all
 
+def _jobs(s: str) -> int:
+    n = int(s)
+    if n < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return n
+
 def main(argv: Optional[Sequence[str]] = None) -> int:
     logging.basicConfig(level=logging.INFO)
     p = argparse.ArgumentParser(prog="loxvihgen", description="Generate Loxone VI-HTTP XML from JSON/XML responses (project-centric)")
@@ -27,6 +33,7 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     pb.add_argument("--polling-time", dest="poll", type=int, default=None, help="Polling interval in seconds")
     pb.add_argument("--address-url", default=None, help="Service URL stored in XML")
     pb.add_argument("--output", type=Path, default=None, help="Output XML path (single-prefix only)")
+    pb.add_argument("--jobs", type=_jobs, default=1, help="Build multiple prefixes in up to N parallel processes")
 
     pa = sub.add_parser("all", help="Fetch → rules (if missing) → build")
     pa.add_argument("project")
@@ -39,7 +46,7 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     if args.cmd == "rules":
         return cmd_rules(args.project, args.force)
     if args.cmd == "build":
-        return cmd_build(args.project, args.title, args.prefix, args.sep, args.poll, args.address_url, args.output)
+        return cmd_build(args.project, args.title, args.prefix, args.sep, args.poll, args.address_url, args.output, args.jobs)
     if args.cmd == "all":
         return cmd_all(args.project, args.url)
     return 2
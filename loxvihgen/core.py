@@ -1,32 +1,93 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Sequence, Tuple
+import sys
+from itertools import chain
+from typing import Dict, List, NamedTuple, Sequence, Tuple
 
-@dataclass(frozen=True)
-class ObjKey:
+# Tokens are plain tuples: cheap to build and hash, and hot loops dispatch on
+# ``type(t) is ArrIdx`` rather than isinstance.
+class ObjKey(NamedTuple):
     key: str
 
-@dataclass(frozen=True)
-class ArrIdx:
+class ArrIdx(NamedTuple):
     key: str  # container/repeated child tag
     idx: int  # 0-based
 
 PathToken = ObjKey | ArrIdx
 
+# Tokens are immutable, so scans share one instance per key (and per small
+# array index) instead of allocating a fresh token for every leaf path. Keys
+# are interned, so lookups against other interned strings (rule tokens) hit
+# by identity.
+#
+# These caches live for the process; once one holds _CACHE_LIMIT entries new
+# values are returned uncached (equal, just not shared) so a long-running
+# library user scanning many different documents doesn't grow them forever.
+_CACHE_LIMIT = 4096
+_OBJ_KEYS: Dict[str, ObjKey] = {}
+_ARR_IDXS: Dict[Tuple[str, int], ArrIdx] = {}
+_ARR_IDX_CACHE_LIMIT = 256  # larger indices are rare; don't let them pile up
+
+def obj_key(key: str) -> ObjKey:
+    tok = _OBJ_KEYS.get(key)
+    if tok is None:
+        tok = ObjKey(sys.intern(key))
+        if len(_OBJ_KEYS) < _CACHE_LIMIT:
+            _OBJ_KEYS[key] = tok
+    return tok
+
+def arr_idx(key: str, idx: int) -> ArrIdx:
+    if idx >= _ARR_IDX_CACHE_LIMIT:
+        return ArrIdx(sys.intern(key), idx)
+    tok = _ARR_IDXS.get((key, idx))
+    if tok is None:
+        tok = ArrIdx(sys.intern(key), idx)
+        if len(_ARR_IDXS) < _CACHE_LIMIT:
+            _ARR_IDXS[(key, idx)] = tok
+    return tok
+
+# Signature elements per array key, shared so equal signatures compare by
+# identity; "$root" arrays contribute nothing.
+_ARR_SIGS: Dict[str, Tuple[str, ...]] = {}
+
+def token_signature(t: PathToken) -> Tuple[str, ...]:
+    """Signature elements contributed by one token (see ``Path.signature``)."""
+    if type(t) is ArrIdx:
+        sig = _ARR_SIGS.get(t.key)
+        if sig is None:
+            sig = () if t.key == "$root" else (f"{t.key}[]",)
+            if len(_ARR_SIGS) < _CACHE_LIMIT:
+                _ARR_SIGS[t.key] = sig
+        return sig
+    return (t.key,)
+
+# One tuple per distinct signature: array rows share it instead of each leaf
+# holding a copy, and dict lookups keyed by it hit by identity.
+_SIGNATURES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+def _shared_signature(sig: Tuple[str, ...]) -> Tuple[str, ...]:
+    canon = _SIGNATURES.get(sig)
+    if canon is None:
+        if len(_SIGNATURES) >= _CACHE_LIMIT:
+            return sig
+        canon = _SIGNATURES[sig] = sig
+    return canon
+
 class Path:
-    def __init__(self, tokens: List[PathToken]):
+    # one Path per numeric leaf; keep it dict-free
+    __slots__ = ("tokens", "_sig")
+
+    def __init__(self, tokens: Sequence[PathToken], sig: Tuple[str, ...] | None = None):
+        """``sig`` may be passed by walkers that build signatures as they go."""
         self.tokens = tokens
+        self._sig = None if sig is None else _shared_signature(sig)
 
     def signature(self) -> Tuple[str, ...]:
-        sig: List[str] = []
-        for t in self.tokens:
-            if isinstance(t, ArrIdx):
-                if t.key != "$root":
-                    sig.append(f"{t.key}[]")
-            else:
-                sig.append(t.key)
-        return tuple(sig)
+        # computed once; decimals aggregation and unit lookup both need it
+        if self._sig is None:
+            sig = tuple(chain.from_iterable(map(token_signature, self.tokens)))
+            self._sig = _shared_signature(sig)
+        return self._sig
 
     def suffix_keys(self) -> List[str]:
-        return [t.key for t in self.tokens if getattr(t, "key", None) and t.key != "$root"]
+        return [t.key for t in self.tokens if t.key and t.key != "$root"]
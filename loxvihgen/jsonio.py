@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: GPL-3.0-only
+"""JSON parsing that uses orjson when it is installed.
+
+Set LOXVIHGEN_NO_ORJSON=1 to force the stdlib implementation.
+"""
+from __future__ import annotations
+import json
+import mmap
+import os
+from typing import Any, BinaryIO
+
+try:
+    if os.environ.get("LOXVIHGEN_NO_ORJSON"):
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter (NaN/Infinity, lone surrogates, BOM);
+            # let the stdlib decoder accept or reject the document
+            pass
+    return json.loads(data)
+
+# inputs at least this large are parsed from a read-only mapping (orjson
+# only) instead of a bytes copy of the whole file
+MMAP_MIN_SIZE = 32 * 1024 * 1024
+
+def load_file(fp: BinaryIO) -> Any:
+    """Parse JSON from an open binary file."""
+    if orjson is None or os.fstat(fp.fileno()).st_size < MMAP_MIN_SIZE:
+        return loads(fp.read())
+    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            try:
+                return orjson.loads(view)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(mm[:])
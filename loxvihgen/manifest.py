@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 from pathlib import Path
 from typing import Any, Dict, Optional
+from . import jsonio
 
 DEFAULT_POLL = 1200
 
@@ -33,7 +34,7 @@ def load_manifest(project: str) -> Dict[str, Any]:
             "prefixes": []
         }
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
+        return jsonio.loads(p.read_bytes())
     except Exception:
         return {
             "project": project,
@@ -1,39 +1,82 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
-import html
-from typing import List
+from functools import lru_cache
+from itertools import islice
+from typing import BinaryIO, Iterator, List
 from .builders import Command
 
+def _escape_attr(s: str) -> str:
+    """Same substitutions as html.escape(s, quote=True).
+
+    The ``in`` guards make the common case (nothing to escape) a few C-level
+    scans with no allocation; ``str.translate`` with a dict table measured
+    an order of magnitude slower.
+    """
+    if "&" in s:
+        s = s.replace("&", "&amp;")
+    if "<" in s:
+        s = s.replace("<", "&lt;")
+    if ">" in s:
+        s = s.replace(">", "&gt;")
+    if '"' in s:
+        s = s.replace('"', "&quot;")
+    if "'" in s:
+        s = s.replace("'", "&#x27;")
+    return s
+
+# fixed tail of every command line, after the variable Check value
+_CMD_SUFFIX = (
+    "\" Signed=\"true\" Analog=\"true\" "
+    "SourceValLow=\"0\" DestValLow=\"0\" "
+    "SourceValHigh=\"100\" DestValHigh=\"100\" "
+    "Comment=\"\"/>\n"
+)
+
+# command lines per encode/write in ``write``
+_WRITE_BATCH = 1024
+
 class ViHttpXmlRenderer:
     def __init__(self, miniserver_min_version: str = "16000610"):
         self.miniserver_min_version = miniserver_min_version
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _xml_attr_escape(s: str) -> str:
         """Escape special characters for use in XML attributes."""
-        return html.escape(s, quote=True)
+        return _escape_attr(s)
 
-    def render(self, commands: List[Command], title: str, address_url: str, polling_time: int, comment_json: str) -> str:
-        title_attr = self._xml_attr_escape(title)
-        addr_attr = self._xml_attr_escape(address_url)
-        comment_attr = self._xml_attr_escape(comment_json) if comment_json else ""
-        lines: List[str] = []
+    def _iter_parts(self, commands: List[Command], title: str, address_url: str, polling_time: int, comment_json: str) -> Iterator[str]:
+        # header attributes are one-off per build; keep them out of the cache
+        title_attr = _escape_attr(title)
+        addr_attr = _escape_attr(address_url)
+        comment_attr = _escape_attr(comment_json) if comment_json else ""
+        yield "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
         if comment_json:
-            lines.append(f"<!-- {comment_json} -->")
-        lines.append(f"<VirtualInHttp Title=\"{title_attr}\" Comment=\"{comment_attr}\" Address=\"{addr_attr}\" HintText=\"\" PollingTime=\"{polling_time}\">")
-        lines.append(f"	<Info templateType=\"2\" minVersion=\"{self.miniserver_min_version}\"/>")
+            yield f"<!-- {comment_json} -->\n"
+        yield f"<VirtualInHttp Title=\"{title_attr}\" Comment=\"{comment_attr}\" Address=\"{addr_attr}\" HintText=\"\" PollingTime=\"{polling_time}\">\n"
+        yield f"	<Info templateType=\"2\" minVersion=\"{self.miniserver_min_version}\"/>\n"
+        # Units repeat and go through the cached escape; titles are unique per
+        # command and would only churn the cache. Check strings are written
+        # as built, unescaped, as before.
+        esc = self._xml_attr_escape
         for c in commands:
-            unit_attr = self._xml_attr_escape(c.unit)
-            lines.append(
-                "	<VirtualInHttpCmd "
-                f"Title=\"{self._xml_attr_escape(c.title)}\" "
-                f"Unit=\"{unit_attr}\" "
-                f"Check=\"{c.check}\" "
-                f"Signed=\"true\" Analog=\"true\" "
-                f"SourceValLow=\"0\" DestValLow=\"0\" "
-                f"SourceValHigh=\"100\" DestValHigh=\"100\" "
-                f"Comment=\"\"/>"
-            )
-        lines.append("</VirtualInHttp>")
-        body = "\n".join(lines) + "\n"
-        return f"<?xml version=\"1.0\" encoding=\"utf-8\"?>{body}"
+            # one f-string compiles to a single BUILD_STRING; faster than
+            # chained + or a % template here
+            yield f"\t<VirtualInHttpCmd Title=\"{_escape_attr(c.title)}\" Unit=\"{esc(c.unit)}\" Check=\"{c.check}{_CMD_SUFFIX}"
+        yield "</VirtualInHttp>\n"
+
+    def render(self, commands: List[Command], title: str, address_url: str, polling_time: int, comment_json: str) -> str:
+        return "".join(self._iter_parts(commands, title, address_url, polling_time, comment_json))
+
+    def write(self, fp: BinaryIO, commands: List[Command], title: str, address_url: str, polling_time: int, comment_json: str) -> None:
+        """Stream ``render`` output to a binary file as UTF-8.
+
+        Lines are joined and encoded in batches: one encode and one write per
+        batch instead of per command line.
+        """
+        parts = self._iter_parts(commands, title, address_url, polling_time, comment_json)
+        while True:
+            chunk = "".join(islice(parts, _WRITE_BATCH))
+            if not chunk:
+                break
+            fp.write(chunk.encode("utf-8"))
@@ -1,61 +1,73 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
 import json
+import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from .core import PathToken
+from . import jsonio
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class UnitRule:
     pattern: str
-    tokens: List[str]
+    tokens: Tuple[str, ...]
     unit: str
     order: int
 
 class Rules:
     def __init__(self, rules: List[UnitRule]):
         self.rules = rules
+        # Suffix trie over reversed rule tokens; the "" entry of a node holds
+        # the precomputed match_unit() result of the rule ending there (tokens
+        # are never empty). Inserting by order keeps the first rule on
+        # duplicate patterns.
+        self._trie: Dict[str, Any] = {}
+        for r in sorted(rules, key=lambda r: r.order):
+            if not r.tokens:
+                continue
+            node = self._trie
+            for tok in reversed(r.tokens):
+                node = node.setdefault(sys.intern(tok), {})
+            node.setdefault("", (r.unit, r.unit.lstrip().startswith("<")))
 
     @staticmethod
     def load(path: Optional[Path]) -> "Rules":
         rules: List[UnitRule] = []
         if path and path.exists():
-            obj = json.loads(path.read_text(encoding="utf-8"))
+            obj = jsonio.loads(path.read_bytes())
             overrides = obj.get("overrides", []) if isinstance(obj, dict) else []
             for i, it in enumerate(overrides):
                 if isinstance(it, dict) and isinstance(it.get("pattern"), str) and isinstance(it.get("unit"), str):
-                    toks = [tok for tok in it["pattern"].replace("[]", "").split(".") if tok]
+                    toks = tuple(tok for tok in it["pattern"].replace("[]", "").split(".") if tok)
                     if toks:
                         rules.append(UnitRule(pattern=it["pattern"], tokens=toks, unit=it["unit"], order=i))
         return Rules(rules)
 
     def match_unit(self, path_tokens: Sequence[PathToken]) -> Optional[Tuple[str, bool]]:
-        reduced = [t.key for t in path_tokens if getattr(t, "key", None) and t.key != "$root"]
-        best: Tuple[int, int, UnitRule] | None = None
-        for r in self.rules:
-            m = len(r.tokens)
-            if m == 0 or m > len(reduced):
-                continue
-            if reduced[-m:] == r.tokens:
-                cand = (m, -r.order, r)
-                if best is None or cand > best:
-                    best = cand
-        if not best:
+        # walk the trie from the last key backwards; the deepest hit is the
+        # longest matching suffix. Most leaves miss on their last key, so the
+        # tokens are scanned in place rather than reduced up front.
+        node = self._trie
+        if not node:
+            # no rules file (the common case): skip the token scan
             return None
-        rule = best[2]
-        if rule.unit.lstrip().startswith("<"):
-            return (rule.unit, True)
-        return (rule.unit, False)
+        hit: Optional[Tuple[str, bool]] = None
+        for t in reversed(path_tokens):
+            key = t.key
+            if not key or key == "$root":
+                continue
+            nxt = node.get(key)
+            if nxt is None:
+                break
+            node = nxt
+            hit = node.get("", hit)
+        return hit
 
 def generate_rules_skeleton(source) -> str:
-    pats: List[str] = []
-    seen: set[str] = set()
+    # a dict dedupes with one hash per leaf
+    seen: Dict[str, None] = {}
     for p, _v, _d in source.iter_numeric_leaves():
-        pat = ".".join([t.key for t in p.tokens if getattr(t, "key", None) and t.key != "$root"])
-        if pat not in seen:
-            seen.add(pat)
-            pats.append(pat)
-    pats.sort()
-    data = {"overrides": [{"pattern": p, "unit": ""} for p in pats]}
+        seen[".".join([t.key for t in p.tokens if t.key and t.key != "$root"])] = None
+    data = {"overrides": [{"pattern": p, "unit": ""} for p in sorted(seen)]}
     return json.dumps(data, indent=2, separators=(",", ":"))
@@ -1,11 +1,12 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
-import urllib.request
+import codecs
 from datetime import datetime, timezone
 import json
 import logging
+import sys
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
 
 from .sources import FormatAdapter
 from .rules import Rules, generate_rules_skeleton
@@ -19,6 +20,7 @@ from .manifest import (
 __version__ = "2.3.0"
 __tool__ = "LoxVIHGen"
 logger = logging.getLogger(__name__)
+_FETCH_CHUNK = 64 * 1024
 
 # ---- util ----
 
@@ -34,7 +36,7 @@ def _full_comment(input_path: Optional[Path], output_path: Optional[Path], rules
     return json.dumps(meta, separators=(",",":"))
 
 
-def _resolve_paths_and_adapter(project: str, m: Dict[str, Any]) -> tuple[FormatAdapter, Rules, Path, Path]:
+def _resolve_paths(project: str, m: Dict[str, Any]) -> tuple[Path, Path]:
     resp_str = m.get("source", {}).get("response")
     resp_path = Path(resp_str) if resp_str else None
     if not resp_path or not resp_path.is_file():
@@ -42,11 +44,16 @@ def _resolve_paths_and_adapter(project: str, m: Dict[str, Any]) -> tuple[FormatA
         if not guess:
             raise FileNotFoundError
         resp_path = guess
-    text = resp_path.read_text(encoding="utf-8")
-    adapter = FormatAdapter.sniff(text)
     rules_path = Path(m.get("rules") or str(rules_default_path(project)))
+    return resp_path, rules_path
+
+
+def _load_inputs(resp_path: Path, rules_path: Path) -> tuple[FormatAdapter, Rules]:
+    adapter = FormatAdapter.from_path(resp_path)
+    # build only needs the scanned leaves; free the parsed tree up front
+    adapter.source.release()
     rules = Rules.load(rules_path if rules_path.exists() else None)
-    return adapter, rules, resp_path, rules_path
+    return adapter, rules
 
 
 def _effective_params(project: str, m: Dict[str, Any], title: Optional[str], prefixes: List[str], sep: Optional[str], poll: Optional[int], address_url: Optional[str]) -> tuple[str, str, int, str, List[str]]:
@@ -75,10 +82,73 @@ def _build_prefix(pref: str, adapter: FormatAdapter, rules: Rules, eff_title: st
         out_path = output_default_path(project, pref or None)
     comment = _full_comment(resp_path, out_path, rules_path if rules_path.exists() else None,
                             {"prefix": pref or "", "sep": eff_sep, "title": full_title, "poll": eff_poll, "address_url": eff_addr})
-    xml = ViHttpXmlRenderer().render(cmds, title=full_title, address_url=eff_addr, polling_time=eff_poll, comment_json=comment)
-    out_path.write_text(xml, encoding="utf-8")
+    # render into a .part file so a failure never leaves truncated XML
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    try:
+        with tmp_path.open("wb") as fp:
+            ViHttpXmlRenderer().write(fp, cmds, title=full_title, address_url=eff_addr, polling_time=eff_poll, comment_json=comment)
+        tmp_path.replace(out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     logger.info("%d commands → %s", len(cmds), out_path)
 
+
+def _iter_decoded(resp: BinaryIO, encoding: str) -> Iterator[str]:
+    dec = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        chunk = resp.read(_FETCH_CHUNK)
+        if not chunk:
+            break
+        yield dec.decode(chunk)
+    yield dec.decode(b"", final=True)
+
+
+# --jobs worker state, set once per worker process by _init_job_worker and
+# never in the parent
+_worker_inputs: Optional[tuple[FormatAdapter, Rules]] = None
+
+
+def _init_job_worker(adapter: FormatAdapter, rules: Rules) -> None:
+    global _worker_inputs
+    _worker_inputs = (adapter, rules)
+
+
+def _build_prefix_job(pref: str, eff_title: str, eff_sep: str, eff_poll: int, eff_addr: str, project: str, prefix_list: List[str], resp_path: Path, rules_path: Path) -> None:
+    """``--jobs`` worker: only the per-prefix title/check/render work runs here."""
+    assert _worker_inputs is not None
+    adapter, rules = _worker_inputs
+    _build_prefix(pref, adapter, rules, eff_title, eff_sep, eff_poll, eff_addr, project, None, prefix_list, resp_path, rules_path)
+
+
+def _download(url: str, project: str) -> Path:
+    """Stream the response to PROJECT.response.{json,xml} as UTF-8."""
+    # urllib.request pulls in http.client/ssl/email; only fetch needs it
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        encoding = resp.headers.get_content_charset() or "utf-8"
+        ctype = (resp.headers.get_content_type() or "").lower()
+        parts = _iter_decoded(resp, encoding)
+        # buffer only until the first non-blank character decides the format
+        head = ""
+        for part in parts:
+            head += part
+            if head.strip():
+                break
+        fmt = "json" if "json" in ctype else ("xml" if "xml" in ctype else ("json" if head.lstrip().startswith(('{','[')) else "xml"))
+        resp_path = Path(f"{project}.response.{fmt}")
+        tmp_path = resp_path.with_name(resp_path.name + ".part")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                f.write(head)
+                for part in parts:
+                    f.write(part)
+            tmp_path.replace(resp_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    return resp_path
+
 # ---- commands ----
 
 def cmd_fetch(project: str, url: Optional[str]) -> int:
@@ -90,17 +160,10 @@ def cmd_fetch(project: str, url: Optional[str]) -> int:
             logger.error("no URL provided and none stored in manifest")
             return 2
     try:
-        with urllib.request.urlopen(url, timeout=30) as resp:
-            raw = resp.read()
-            encoding = resp.headers.get_content_charset() or "utf-8"
-            text = raw.decode(encoding, errors="replace")
-            ctype = (resp.headers.get_content_type() or "").lower()
+        resp_path = _download(url, project)
     except Exception as e:
         logger.error("fetch failed: %s", e)
         return 4
-    fmt = "json" if "json" in ctype else ("xml" if "xml" in ctype else ("json" if text.lstrip().startswith(('{','[')) else "xml"))
-    resp_path = Path(f"{project}.response.{fmt}")
-    resp_path.write_text(text, encoding="utf-8")
 
     m = load_manifest(project)
     m.setdefault("project", project)
@@ -131,9 +194,8 @@ def cmd_rules(project: str, force: bool) -> int:
             print(msg)
             return 6
         resp_path = guess
-    text = resp_path.read_text(encoding="utf-8")
 
-    adapter = FormatAdapter.sniff(text)
+    adapter = FormatAdapter.from_path(resp_path)
     content = generate_rules_skeleton(adapter.source)
 
     rules_path = Path(f"{project}.rules.json")
@@ -154,36 +216,42 @@ def cmd_rules(project: str, force: bool) -> int:
     return 0
 
 
-def cmd_build(project: str, title: Optional[str], prefixes: List[str], sep: Optional[str], poll: Optional[int], address_url: Optional[str], output: Optional[Path]) -> int:
+def cmd_build(project: str, title: Optional[str], prefixes: List[str], sep: Optional[str], poll: Optional[int], address_url: Optional[str], output: Optional[Path], jobs: int = 1) -> int:
     m = load_manifest(project)
     try:
-        adapter, rules, resp_path, rules_path = _resolve_paths_and_adapter(project, m)
+        resp_path, rules_path = _resolve_paths(project, m)
     except FileNotFoundError:
         msg = f"response missing. Expected {project}.response.json or {project}.response.xml"
         logger.error(msg)
         print(msg)
         return 6
 
-    b = m.get("build", {})
-    eff_title = title or b.get("title") or project
-    eff_sep = sep if sep is not None else b.get("name_separator", " ")
-    eff_poll = int(poll if poll is not None else b.get("polling_time", DEFAULT_POLL))
-    eff_addr = address_url or b.get("address_url") or m.get("source", {}).get("url") or "http://..."
-
-    prefix_list: List[str] = prefixes if prefixes else list(m.get("prefixes", []))
-    if not prefix_list:
-        prefix_list = [""]
-
-    renderer = ViHttpXmlRenderer()
-
     eff_title, eff_sep, eff_poll, eff_addr, prefix_list = _effective_params(project, m, title, prefixes, sep, poll, address_url)
 
-    try:
-        for pref in prefix_list:
-            _build_prefix(pref, adapter, rules, eff_title, eff_sep, eff_poll, eff_addr, project, output, prefix_list, resp_path, rules_path)
-    except ValueError as e:
-        logger.error(str(e))
-        return 2
+    adapter, rules = _load_inputs(resp_path, rules_path)
+    if jobs > 1 and len(prefix_list) > 1 and output is None:
+        # prefixes are independent outputs. _load_inputs scanned the
+        # response once; hand the scanned inputs to each worker through its
+        # initializer. fork inherits them for free but is only safe on
+        # Linux; elsewhere the default start method pickles them once per
+        # worker.
+        # multiprocessing is only imported when --jobs can apply.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        ctx = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else None)
+        with ProcessPoolExecutor(max_workers=min(jobs, len(prefix_list)), mp_context=ctx,
+                                 initializer=_init_job_worker, initargs=(adapter, rules)) as pool:
+            futures = [pool.submit(_build_prefix_job, pref, eff_title, eff_sep, eff_poll, eff_addr, project, prefix_list, resp_path, rules_path)
+                       for pref in prefix_list]
+            for f in futures:
+                f.result()
+    else:
+        try:
+            for pref in prefix_list:
+                _build_prefix(pref, adapter, rules, eff_title, eff_sep, eff_poll, eff_addr, project, output, prefix_list, resp_path, rules_path)
+        except ValueError as e:
+            logger.error(str(e))
+            return 2
 
     # back-fill manifest defaults if missing
     m.setdefault("build", {})
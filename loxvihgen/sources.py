@@ -1,90 +1,291 @@
 # SPDX-License-Identifier: GPL-3.0-only
 from __future__ import annotations
-import json
-import xml.etree.ElementTree as ET
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
-from .core import ObjKey, ArrIdx, Path, PathToken
+import os
+import re
+from array import array
+from collections import defaultdict
+from pathlib import Path as FilePath
+from typing import Any, BinaryIO, DefaultDict, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .core import Path, PathToken, arr_idx, obj_key, token_signature
+from . import jsonio
 
+# lxml (libxml2) parses considerably faster than the stdlib parser on large
+# responses; set LOXVIHGEN_NO_LXML=1 to force the stdlib fallback.
+try:
+    if os.environ.get("LOXVIHGEN_NO_LXML"):
+        raise ImportError
+    from lxml import etree as ET  # type: ignore[import-untyped]
+    # lxml<5 only tests resolve_entities for truth: "internal" would expand
+    # external (file://) entities too
+    if ET.LXML_VERSION < (5, 0):
+        raise ImportError
+    # match ElementTree: comments/PIs are not part of the element tree.
+    # libxml2's default limits (see _XML_MAX_DEPTH) stay on: huge_tree
+    # would also drop its entity-expansion checks. Internal DTD
+    # entities are expanded like the stdlib does; external ones never are.
+    # Shared by the tree and the streaming parser so the two can't drift.
+    _LXML_OPTIONS: Dict[str, Any] = dict(remove_comments=True, remove_pis=True, encoding="utf-8",
+                                         resolve_entities="internal", no_network=True)
+    _XML_PARSER = ET.XMLParser(**_LXML_OPTIONS)
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _XML_PARSER = None
+
+# libxml2's default limits. lxml enforces them itself; documents parsed with
+# the stdlib are checked against the same values, so whether a response is
+# accepted doesn't depend on lxml being installed.
+_XML_MAX_DEPTH = 256
+_XML_MAX_TEXT = 10_000_000  # UTF-8 bytes per text node
+_XML_TOO_DEEP = f"XML nested deeper than {_XML_MAX_DEPTH} levels"
+_XML_TEXT_TOO_LONG = f"XML text node longer than {_XML_MAX_TEXT} bytes"
+
+def _check_xml_text(t: Optional[str]) -> None:
+    # a str of n chars encodes to n..4n bytes; only long ones need encoding
+    if t is not None and len(t) > _XML_MAX_TEXT // 4 and len(t.encode("utf-8")) > _XML_MAX_TEXT:
+        raise ValueError(_XML_TEXT_TOO_LONG)
+
+def _check_xml_limits(root: "ET.Element") -> None:
+    """Apply libxml2's limits to a tree the stdlib parser accepted."""
+    stack = [(root, 1)]
+    while stack:
+        e, depth = stack.pop()
+        if depth > _XML_MAX_DEPTH:
+            raise ValueError(_XML_TOO_DEEP)
+        _check_xml_text(e.text)
+        _check_xml_text(e.tail)
+        stack.extend((ch, depth + 1) for ch in e)
+
+def _xml_limit_error(e: SyntaxError) -> Optional[ValueError]:
+    """The ValueError for a libxml2 limit rejection, None for other errors."""
+    msg = str(e)
+    if "Excessive depth" in msg:
+        return ValueError(_XML_TOO_DEEP)
+    # "Text node too long" since libxml2 2.11, "huge text node" before
+    if "Text node too long" in msg or "huge text node" in msg:
+        return ValueError(_XML_TEXT_TOO_LONG)
+    return None
+
+def _parse_xml(text: str) -> "ET.Element":
+    if _XML_PARSER is None:
+        root = ET.fromstring(text)
+        _check_xml_limits(root)
+        return root
+    # lxml rejects str input carrying an encoding declaration; the text is
+    # already decoded, so hand it over as UTF-8 and override the declaration.
+    try:
+        return ET.fromstring(text.encode("utf-8"), _XML_PARSER)
+    except SyntaxError as e:
+        err = _xml_limit_error(e)
+        if err is None:
+            raise
+        raise err from e
+
+def _iterparse(fp: BinaryIO) -> Iterator[Tuple[str, "ET.Element"]]:
+    # responses are always read as UTF-8, whatever the declaration says
+    if _XML_PARSER is None:
+        return ET.iterparse(fp, events=("start", "end"), parser=ET.XMLParser(encoding="utf-8"))
+    return ET.iterparse(fp, events=("start", "end"), **_LXML_OPTIONS)
 
 def _count_decimals(val: float) -> int:
-    s = str(val)
-    if "e" in s or "E" in s:
+    # Whole floats below 1e16 repr as "N.0": one decimal, no string needed.
+    if type(val) is float and val.is_integer() and -1e16 < val < 1e16:
+        return 1
+    s = repr(val)
+    e = s.find("e")
+    if e >= 0:
+        # repr is the shortest round-trip form: mantissa digits shifted by the
+        # exponent give the decimals, unless ".12f" rounding cuts them off
+        dot = s.find(".", 0, e)
+        d = (0 if dot < 0 else e - dot - 1) - int(s[e + 1:])
+        if d <= 12:
+            return max(d, 0)
         s = format(val, ".12f").rstrip("0").rstrip(".")
-    return len(s.split(".")[1]) if "." in s else 0
+    dot = s.find(".")
+    return 0 if dot < 0 else len(s) - dot - 1
+
+class _DecimalCounts(dict):
+    """Per-scan memo of ``_count_decimals``; values repeat a lot in practice."""
+    def __missing__(self, val: float) -> int:
+        d = self[val] = _count_decimals(val)
+        return d
 
 NumberLeaf = Tuple[Path, float, int]  # (path, value, decimals)
 
+class LeafTable:
+    """Numeric leaves stored column-wise.
+
+    Values and decimal counts live in typed ``array`` columns instead of one
+    tuple plus boxed float/int per leaf; iterating yields ``NumberLeaf``.
+    The maximum decimals per path signature are aggregated as leaves are
+    added.
+    """
+    __slots__ = ("paths", "values", "decimals", "max_decimals")
+
+    def __init__(self) -> None:
+        self.paths: List[Path] = []
+        self.values = array("d")
+        self.decimals = array("H")
+        self.max_decimals: Dict[Tuple[str, ...], int] = {}
+
+    def add(self, path: Path, value: float, decimals: int) -> None:
+        self.paths.append(path)
+        self.values.append(value)
+        self.decimals.append(decimals)
+        sig = path.signature()
+        if decimals > self.max_decimals.get(sig, -1):
+            self.max_decimals[sig] = decimals
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[NumberLeaf]:
+        return zip(self.paths, self.values, self.decimals)
+
+def max_decimals_by_signature(leaves: Iterable[NumberLeaf]) -> Dict[Tuple[str, ...], int]:
+    """Maximum decimals per path signature, across array rows."""
+    decs: Dict[Tuple[str, ...], int] = {}
+    for p, _v, d in leaves:
+        sig = p.signature()
+        if d > decs.get(sig, -1):
+            decs[sig] = d
+    return decs
+
+def _widths_from_lengths(lengths: Dict[str, int]) -> Dict[str, int]:
+    return {k: max(1, len(str(max(0, ln - 1)))) for k, ln in lengths.items()}
+
 class HierSource:
     """Structure-only view. No Loxone-specific logic here."""
     def iter_numeric_leaves(self) -> Iterable[NumberLeaf]:
         raise NotImplementedError
     def index_widths(self) -> Dict[str, int]:
         raise NotImplementedError
+    def decimals_by_signature(self) -> Dict[Tuple[str, ...], int]:
+        """Maximum decimals per path signature, across array rows."""
+        return max_decimals_by_signature(self.iter_numeric_leaves())
+    def release(self) -> None:
+        """Scan now and drop whatever only the scan needed; a no-op here."""
 
 class JSONSource(HierSource):
+    """Source over a parsed JSON document.
+
+    The first scan keeps the leaf table and array lengths; ``root`` stays
+    until ``release()`` drops it (the CLI does, to free the parsed tree).
+    """
     def __init__(self, root: Any):
-        self.root = root
-        self._widths = self._calc_widths(root)
+        self.root: Any = root
+        self._scanned: Optional[Tuple[LeafTable, Dict[str, int]]] = None
 
     @staticmethod
-    def sniff_and_make(text: str) -> "JSONSource":
-        return JSONSource(json.loads(text))
+    def sniff_and_make(text: str | bytes) -> "JSONSource":
+        return JSONSource(jsonio.loads(text))
 
     @staticmethod
     def _is_number(x: Any) -> bool:
+        # parsers only produce exact int/float; the identity checks are the
+        # fast path, subclasses (IntEnum, numpy.float64, ...) still count
+        t = type(x)
+        if t is float or t is int:
+            return True
         return isinstance(x, (int, float)) and not isinstance(x, bool)
 
     @staticmethod
-    def _calc_widths(node: Any) -> Dict[str, int]:
-        lengths: Dict[str, int] = {}
-        def walk(n: Any) -> None:
-            if isinstance(n, dict):
-                for k, v in n.items():
-                    if isinstance(v, list):
-                        lengths[k] = max(lengths.get(k, 0), len(v))
-                        for it in v:
-                            walk(it)
-                    else:
-                        walk(v)
-            elif isinstance(n, list):
-                for it in n:
-                    walk(it)
-        walk(node)
-        return {k: max(1, len(str(max(0, ln - 1)))) for k, ln in lengths.items()}
+    def _pairs(n: Any, lengths: DefaultDict[str, int]) -> Iterator[Tuple[PathToken, Any]]:
+        """(token, child) pairs of a container, recording array lengths.
 
-    def iter_numeric_leaves(self) -> Iterable[NumberLeaf]:
-        def walk(n: Any, pref: List[PathToken]):
-            if isinstance(n, dict):
-                for k, v in n.items():
-                    if isinstance(v, list):
-                        for i, it in enumerate(v):
-                            yield from walk(it, pref + [ArrIdx(k, i)])
-                    else:
-                        yield from walk(v, pref + [ObjKey(k)])
-            elif isinstance(n, list):
-                for i, v in enumerate(n):
-                    yield from walk(v, pref + [ArrIdx("$root", i)])
+        Generated lazily, so the walk holds one cursor per open container
+        rather than a copy of its children.
+        """
+        if isinstance(n, list):
+            for i, v in enumerate(n):
+                yield arr_idx("$root", i), v
+            return
+        for k, v in n.items():
+            if isinstance(v, list):
+                if len(v) > lengths[k]:
+                    lengths[k] = len(v)
+                for i, it in enumerate(v):
+                    yield arr_idx(k, i), it
             else:
-                if JSONSource._is_number(n):
-                    # ``_count_decimals`` expects the original representation to
-                    # determine the number of fractional digits.  Converting an
-                    # integer to ``float`` first would always introduce a ".0"
-                    # and therefore report one decimal place for integers.
-                    fv = float(n)
-                    yield (Path(pref.copy()), fv, _count_decimals(n))
-        yield from walk(self.root, [])
+                yield obj_key(k), v
+
+    def _scan(self) -> Tuple[LeafTable, Dict[str, int]]:
+        """Collect numeric leaves and array lengths in a single walk.
+
+        Iterative depth-first walk: ``stack`` holds the pending children of
+        every open container and ``pref`` the tokens leading to the top one.
+        """
+        if self._scanned is not None:
+            return self._scanned
+        leaves = LeafTable()
+        lengths: DefaultDict[str, int] = defaultdict(int)
+        decimals = _DecimalCounts()
+        pref: List[PathToken] = []
+        # signature of each open container's path, extended as we descend
+        sigs: List[Tuple[str, ...]] = [()]
+        stack: List[Iterator[Tuple[PathToken, Any]]] = []
+        root = self.root
+        if isinstance(root, (dict, list)):
+            stack.append(self._pairs(root, lengths))
+        elif JSONSource._is_number(root):
+            leaves.add(Path((), ()), float(root), 0 if isinstance(root, int) else _count_decimals(float(root)))
+        while stack:
+            for tok, v in stack[-1]:
+                if isinstance(v, (dict, list)):
+                    pref.append(tok)
+                    sigs.append(sigs[-1] + token_signature(tok))
+                    stack.append(self._pairs(v, lengths))
+                    break
+                # Integers have no fractional digits and skip the string work
+                # in ``_count_decimals``.  Floats are counted on their original
+                # representation, so 5.0 keeps its one decimal.
+                tv = type(v)
+                if tv is float:
+                    leaves.add(Path((*pref, tok), sigs[-1] + token_signature(tok)), v, decimals[v])
+                elif tv is int:
+                    leaves.add(Path((*pref, tok), sigs[-1] + token_signature(tok)), float(v), 0)
+                elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                    # roots built by hand may hold int/float subclasses
+                    fv = float(v)
+                    leaves.add(Path((*pref, tok), sigs[-1] + token_signature(tok)), fv,
+                               0 if isinstance(v, int) else decimals[fv])
+            else:
+                stack.pop()
+                if pref:
+                    pref.pop()
+                    sigs.pop()
+        self._scanned = (leaves, _widths_from_lengths(lengths))
+        return self._scanned
+
+    def release(self) -> None:
+        """Scan, then set ``root`` to ``None``.
+
+        Everything later steps need is in the leaf table, so the parsed tree
+        need not stay alive through build and render.
+        """
+        self._scan()
+        self.root = None
+
+    def iter_numeric_leaves(self) -> Iterable[NumberLeaf]:
+        return iter(self._scan()[0])
 
     def index_widths(self) -> Dict[str, int]:
-        return dict(self._widths)
+        return dict(self._scan()[1])
+
+    def decimals_by_signature(self) -> Dict[Tuple[str, ...], int]:
+        return dict(self._scan()[0].max_decimals)
 
 class XMLSource(HierSource):
+    """Source over a parsed XML element tree.
+
+    Like ``JSONSource``, ``root`` is kept until ``release()``.
+    """
     def __init__(self, root: ET.Element):
-        self.root = root
-        self._widths = self._calc_widths(root)
+        self.root: Optional[ET.Element] = root
+        self._scanned: Optional[Tuple[LeafTable, Dict[str, int]]] = None
 
     @staticmethod
     def sniff_and_make(text: str) -> "XMLSource":
-        return XMLSource(ET.fromstring(text))
+        return XMLSource(_parse_xml(text))
 
     @staticmethod
     def _try_parse_number(s: Optional[str]) -> Optional[float]:
@@ -97,43 +298,162 @@ class XMLSource(HierSource):
             return None
 
     @staticmethod
-    def _calc_widths(elem: ET.Element) -> Dict[str, int]:
-        lengths: Dict[str, int] = {}
-        def walk(e: ET.Element):
-            children = list(e)
-            tags: Dict[str, int] = {}
-            for ch in children:
-                tags[ch.tag] = tags.get(ch.tag, 0) + 1
-            for tag, cnt in tags.items():
-                if cnt > 1:
-                    lengths[tag] = max(lengths.get(tag, 0), cnt)
-            for ch in children:
-                walk(ch)
-        walk(elem)
-        return {k: max(1, len(str(max(0, ln - 1)))) for k, ln in lengths.items()}
+    def _pairs(children: List[ET.Element], lengths: DefaultDict[str, int]) -> List[Tuple[PathToken, ET.Element]]:
+        """(token, child) pairs grouped by tag, recording repeated-tag counts."""
+        groups: Dict[str, List[ET.Element]] = {}
+        for ch in children:
+            # lxml keeps entity (and, unless removed, comment/PI) nodes as
+            # children whose tag is not a str
+            if type(ch.tag) is str:
+                groups.setdefault(ch.tag, []).append(ch)
+        out: List[Tuple[PathToken, ET.Element]] = []
+        for tag, group in groups.items():
+            if len(group) == 1:
+                out.append((obj_key(tag), group[0]))
+            else:
+                if len(group) > lengths[tag]:
+                    lengths[tag] = len(group)
+                out.extend((arr_idx(tag, i), ch) for i, ch in enumerate(group))
+        return out
+
+    def _scan(self) -> Tuple[LeafTable, Dict[str, int]]:
+        """Collect numeric leaves and repeated-tag counts in a single walk.
+
+        Same explicit-stack walk as ``JSONSource._scan``.
+        """
+        if self._scanned is not None:
+            return self._scanned
+        leaves = LeafTable()
+        lengths: DefaultDict[str, int] = defaultdict(int)
+        decimals = _DecimalCounts()
+        pref: List[PathToken] = []
+        sigs: List[Tuple[str, ...]] = [()]
+        stack: List[Iterator[Tuple[PathToken, ET.Element]]] = []
+        root = self.root
+        assert root is not None  # only released once _scanned is set
+        children = list(root)
+        if children:
+            stack.append(iter(self._pairs(children, lengths)))
+        else:
+            num = XMLSource._try_parse_number(root.text)
+            if num is not None:
+                leaves.add(Path((obj_key(root.tag),)), num, _count_decimals(num))
+        while stack:
+            for tok, e in stack[-1]:
+                children = list(e)
+                if children:
+                    pref.append(tok)
+                    sigs.append(sigs[-1] + token_signature(tok))
+                    stack.append(iter(self._pairs(children, lengths)))
+                    break
+                num = XMLSource._try_parse_number(e.text)
+                if num is not None:
+                    leaf = obj_key(e.tag)
+                    leaves.add(Path((*pref, tok, leaf), sigs[-1] + token_signature(tok) + (leaf.key,)), num, decimals[num])
+            else:
+                stack.pop()
+                if pref:
+                    pref.pop()
+                    sigs.pop()
+        self._scanned = (leaves, _widths_from_lengths(lengths))
+        return self._scanned
+
+    def release(self) -> None:
+        """See ``JSONSource.release``."""
+        self._scan()
+        self.root = None
 
     def iter_numeric_leaves(self) -> Iterable[NumberLeaf]:
-        def walk(e: ET.Element, pref: List[PathToken]):
-            children = list(e)
+        return iter(self._scan()[0])
+
+    def index_widths(self) -> Dict[str, int]:
+        return dict(self._scan()[1])
+
+    def decimals_by_signature(self) -> Dict[Tuple[str, ...], int]:
+        return dict(self._scan()[0].max_decimals)
+
+class XMLStreamSource(HierSource):
+    """XML source scanned with iterparse; the element tree is never kept.
+
+    Whether a child becomes ``ObjKey`` or ``ArrIdx`` depends on how many
+    siblings share its tag, which is only known once the parent closes.
+    Leaf paths are therefore assembled bottom-up (innermost token first)
+    and reversed when the root element ends.
+    """
+    def __init__(self, fp: BinaryIO):
+        try:
+            self._leaves, self._widths = self._scan(fp)
+        except SyntaxError as e:
+            err = _xml_limit_error(e)
+            if err is None:
+                raise
+            raise err from e
+
+    @staticmethod
+    def _scan(fp: BinaryIO) -> Tuple[LeafTable, Dict[str, int]]:
+        lengths: DefaultDict[str, int] = defaultdict(int)
+        decimals = _DecimalCounts()
+        RevLeaf = Tuple[List[PathToken], float, int]
+        # per open element: (child tag, child leaves) in document order
+        frames: List[List[Tuple[str, List[RevLeaf]]]] = []
+        # open elements, so finished children can be detached from them
+        parents: List["ET.Element"] = []
+        result: List[RevLeaf] = []
+        for event, elem in _iterparse(fp):
+            if event == "start":
+                frames.append([])
+                parents.append(elem)
+                if len(parents) > _XML_MAX_DEPTH:
+                    raise ValueError(_XML_TOO_DEEP)
+                continue
+            # same limits with either parser; tails are skipped like libxml2
+            # does once their element is detached
+            _check_xml_text(elem.text)
+            parents.pop()
+            children = frames.pop()
+            leaves: List[RevLeaf] = []
             if not children:
-                num = XMLSource._try_parse_number(e.text)
+                num = XMLSource._try_parse_number(elem.text)
                 if num is not None:
-                    yield (Path(pref + [ObjKey(e.tag)]), num, _count_decimals(num))
-                return
-            groups: Dict[str, List[ET.Element]] = {}
-            for ch in children:
-                groups.setdefault(ch.tag, []).append(ch)
-            for tag, group in groups.items():
-                if len(group) == 1:
-                    yield from walk(group[0], pref + [ObjKey(tag)])
-                else:
-                    for i, ch in enumerate(group):
-                        yield from walk(ch, pref + [ArrIdx(tag, i)])
-        yield from walk(self.root, [])
+                    leaves.append(([obj_key(elem.tag)], num, decimals[num]))
+            else:
+                groups: Dict[str, List[List[RevLeaf]]] = {}
+                for tag, ch_leaves in children:
+                    groups.setdefault(tag, []).append(ch_leaves)
+                for tag, group in groups.items():
+                    if len(group) > 1 and len(group) > lengths[tag]:
+                        lengths[tag] = len(group)
+                    for i, ch_leaves in enumerate(group):
+                        tok = obj_key(tag) if len(group) == 1 else arr_idx(tag, i)
+                        for rev, _v, _d in ch_leaves:
+                            rev.append(tok)
+                        leaves.extend(ch_leaves)
+            tag = elem.tag
+            elem.clear()
+            if parents:
+                # children finish in order and are removed as they do, so
+                # this one is found first; memory stays bounded by depth
+                parents[-1].remove(elem)
+            if frames:
+                frames[-1].append((tag, leaves))
+            else:
+                result = leaves
+        out = LeafTable()
+        for rev, v, d in result:
+            out.add(Path(tuple(reversed(rev))), v, d)
+        return out, _widths_from_lengths(lengths)
+
+    def iter_numeric_leaves(self) -> Iterable[NumberLeaf]:
+        return iter(self._leaves)
 
     def index_widths(self) -> Dict[str, int]:
         return dict(self._widths)
 
+    def decimals_by_signature(self) -> Dict[Tuple[str, ...], int]:
+        return dict(self._leaves.max_decimals)
+
+_LEADING_WS = re.compile(r"\s*")
+
 class FormatAdapter:
     def __init__(self, source: HierSource, kind: str):
         self.source = source
@@ -141,13 +461,32 @@ class FormatAdapter:
 
     @staticmethod
     def sniff(text: str) -> "FormatAdapter":
-        s = text.lstrip()
-        if s.startswith("<"):
+        # peek at the first non-blank char without copying the whole text
+        i = _LEADING_WS.match(text).end()  # type: ignore[union-attr]  # \s* always matches
+        first = text[i:i + 1]
+        if first == "<":
             return FormatAdapter(XMLSource.sniff_and_make(text), "xml")
-        if s.startswith("{") or s.startswith("["):
+        if first == "{" or first == "[":
             return FormatAdapter(JSONSource.sniff_and_make(text), "json")
-        # try both
+        # try both; each parse is kept, never repeated
         try:
             return FormatAdapter(JSONSource.sniff_and_make(text), "json")
         except Exception:
             return FormatAdapter(XMLSource.sniff_and_make(text), "xml")
+
+    @staticmethod
+    def from_path(path: FilePath) -> "FormatAdapter":
+        """Like ``sniff`` but streams XML responses straight from the file.
+
+        JSON is parsed from the raw bytes (mapped for large files), skipping
+        the str decode.
+        """
+        with path.open("rb") as fp:
+            head = fp.read(256).lstrip()
+            fp.seek(0)
+            if head.startswith(b"<"):
+                return FormatAdapter(XMLStreamSource(fp), "xml")
+            if head.startswith((b"{", b"[")):
+                return FormatAdapter(JSONSource(jsonio.load_file(fp)), "json")
+            raw = fp.read()
+        return FormatAdapter.sniff(raw.decode("utf-8"))
@@ -1,6 +1,11 @@
+import json
+import pytest
+from loxvihgen import service
+from loxvihgen.cli import main
 from loxvihgen.core import ObjKey, ArrIdx, Path
-from loxvihgen.builders import TitleBuilder, JSONCheckStringBuilder, XMLCheckStringBuilder
-from loxvihgen.service import cmd_build
+from loxvihgen.builders import TitleBuilder, VIHBuilder, JSONCheckStringBuilder, XMLCheckStringBuilder
+from loxvihgen.rules import Rules
+from loxvihgen.service import cmd_build, cmd_fetch
 
 widths = {"b": 2}
 
@@ -9,17 +14,56 @@ def test_title_builder_with_indices():
     tb = TitleBuilder(sep='.', prefix='pref', width_by_key=widths)
     assert tb.for_path(p) == 'pref.a.b.b[09].c'
 
+def test_title_builder_index_label_with_percent_key():
+    assert TitleBuilder(sep=' ', prefix='', width_by_key={"5%": 3}).for_path(Path([ArrIdx("5%", 7)])) == '5%[007]'
+
 def test_json_check_string():
     p = Path([ObjKey("a"), ObjKey("b"), ArrIdx("b", 1), ObjKey("c")])
     chk = JSONCheckStringBuilder().build(p)
     assert '\\i&quot;a&quot;:\\i' in chk and chk.endswith('\\v')
 
+def test_json_check_string_array_braces():
+    assert JSONCheckStringBuilder().build(Path([ArrIdx("b", 2)])) == '\\i&quot;b&quot;:[\\i' + '\\i{\\i' * 3 + '\\v'
+
+def test_check_string_reused_across_rows_and_depths():
+    paths = [Path([ObjKey("a"), ArrIdx("r", i), ObjKey(k)]) for i in range(3) for k in ("x", "y")]
+    paths += [Path([ArrIdx("r", 1)]), Path([ObjKey("z")]), Path([ObjKey("a"), ArrIdx("r", 0), ObjKey("x")])]
+    shared = JSONCheckStringBuilder()
+    assert [shared.build(p) for p in paths] == [JSONCheckStringBuilder().build(p) for p in paths]
+
 def test_xml_check_string():
     p = Path([ObjKey("root"), ArrIdx("item", 2), ObjKey("value")])
     chk = XMLCheckStringBuilder().build(p)
     assert '\\i&lt;root&gt;\\i' in chk and chk.endswith('\\v')
 
 
+def test_vih_builder_accepts_duck_typed_source():
+    class LeafList:
+        def __init__(self, leaves):
+            self.leaves = leaves
+        def iter_numeric_leaves(self):
+            return iter(self.leaves)
+        def index_widths(self):
+            return {"r": 1}
+    src = LeafList([(Path([ArrIdx("r", 0), ObjKey("v")]), 1.0, 0),
+                    (Path([ArrIdx("r", 1), ObjKey("v")]), 2.25, 2)])
+    tb = TitleBuilder(sep='.', prefix='', width_by_key=src.index_widths())
+    cmds = VIHBuilder(src, tb, Rules([]), JSONCheckStringBuilder()).build_commands()
+    assert [(c.title, c.unit) for c in cmds] == [('r[0].v', '<v.2>'), ('r[1].v', '<v.2>')]
+
+def test_vih_builder_reads_one_shot_source_once():
+    class OneShot:
+        def __init__(self, leaves):
+            self.leaves = iter(leaves)
+        def iter_numeric_leaves(self):
+            return self.leaves
+        def index_widths(self):
+            return {}
+    src = OneShot([(Path([ObjKey("a")]), 1.5, 1), (Path([ObjKey("b")]), 2.0, 0)])
+    tb = TitleBuilder(sep='.', prefix='', width_by_key={})
+    cmds = VIHBuilder(src, tb, Rules([]), JSONCheckStringBuilder()).build_commands()
+    assert [(c.title, c.unit) for c in cmds] == [('a', '<v.1>'), ('b', '<v>')]
+
 def test_cmd_build_missing_response(tmp_path, monkeypatch, capsys):
     project = "proj"
     monkeypatch.chdir(tmp_path)
@@ -40,3 +84,54 @@ def test_cmd_build_multiple_prefixes(tmp_path, monkeypatch):
     xml2 = (tmp_path / "VI_proj--p2.xml").read_text()
     assert 'VirtualInHttpCmd Title="p1.a"' in xml1
     assert 'VirtualInHttpCmd Title="p2.a"' in xml2
+
+
+def test_cmd_build_keeps_previous_output_on_render_failure(tmp_path, monkeypatch):
+    project = "proj"
+    (tmp_path / f"{project}.response.json").write_text('{"a": 1}')
+    out = tmp_path / "out.xml"
+    out.write_text("previous")
+    monkeypatch.chdir(tmp_path)
+    def fail(self, fp, *args, **kwargs):
+        fp.write(b"<?xml")
+        raise RuntimeError("render failed")
+    monkeypatch.setattr(service.ViHttpXmlRenderer, "write", fail)
+    with pytest.raises(RuntimeError):
+        cmd_build(project, title=None, prefixes=[], sep=None, poll=None, address_url=None, output=out)
+    assert out.read_text() == "previous"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.xml", "proj.response.json"]
+
+
+def test_cmd_build_prefixes_in_parallel(tmp_path, monkeypatch):
+    project = "proj"
+    (tmp_path / f"{project}.response.json").write_text('{"a": [1, 2.5]}')
+    monkeypatch.chdir(tmp_path)
+    def commands(pref):
+        xml = (tmp_path / f"VI_proj--{pref}.xml").read_text()
+        return [line for line in xml.splitlines() if "<VirtualInHttpCmd " in line]
+    prefixes = ["p1", "p2", "p3"]
+    assert cmd_build(project, title=None, prefixes=prefixes, sep=".", poll=None, address_url=None, output=None) == 0
+    serial = {pref: commands(pref) for pref in prefixes}
+    exit_code = cmd_build(project, title=None, prefixes=prefixes, sep=".", poll=None, address_url=None, output=None, jobs=2)
+    assert exit_code == 0
+    for pref in prefixes:
+        assert commands(pref) == serial[pref]
+        assert any(f'Title="{pref}.a[1]" Unit="&lt;v.1&gt;"' in line for line in serial[pref])
+
+
+def test_cli_rejects_non_positive_jobs(capsys):
+    for bad in ("0", "-2"):
+        with pytest.raises(SystemExit) as e:
+            main(["build", "proj", "--jobs", bad])
+        assert e.value.code == 2
+    assert "must be at least 1" in capsys.readouterr().err
+
+
+def test_cmd_fetch_streams_response(tmp_path, monkeypatch):
+    src = tmp_path / "remote.json"
+    src.write_bytes(b'  {"a": 1.5, "t": "\xc3\xa4"}')
+    monkeypatch.chdir(tmp_path)
+    assert cmd_fetch("proj", src.as_uri()) == 0
+    assert (tmp_path / "proj.response.json").read_bytes() == src.read_bytes()
+    assert not (tmp_path / "proj.response.json.part").exists()
+    assert json.loads((tmp_path / "proj.vih.json").read_text())["source"]["url"] == src.as_uri()
@@ -1,6 +1,12 @@
-import json
+import io
+import os
+import subprocess
+import sys
+from enum import IntEnum
+import pytest
+from loxvihgen import jsonio
 from loxvihgen.core import ObjKey, ArrIdx, Path
-from loxvihgen.sources import JSONSource
+from loxvihgen.sources import FormatAdapter, JSONSource, XMLSource, XMLStreamSource, _count_decimals
 
 sample = {"a": {"b": [1.2, 3, {"c": 4.56}]}}
 
@@ -8,6 +14,10 @@ def test_path_signature():
     p = Path([ObjKey("a"), ObjKey("b"), ArrIdx("b", 2), ObjKey("c")])
     assert p.signature() == ("a","b","b[]","c")
 
+def test_path_signature_computed_once():
+    p = Path([ObjKey("a"), ArrIdx("b", 2), ObjKey("c")])
+    assert p.signature() is p.signature()
+
 def test_json_numeric_leaves_and_decimals():
     src = JSONSource(sample)
     leaves = list(src.iter_numeric_leaves())
@@ -15,3 +25,184 @@ def test_json_numeric_leaves_and_decimals():
     assert len(leaves) == 3
     decs = sorted(d for _p, _v, d in leaves)
     assert decs == [0,1,2]
+
+def test_json_numeric_subclasses_kept():
+    class F(float):
+        pass
+    class L(IntEnum):
+        X = 3
+    src = JSONSource({"f": F(1.5), "e": L.X, "b": True})
+    assert [(p.signature(), v, d) for p, v, d in src.iter_numeric_leaves()] == [(("f",), 1.5, 1), (("e",), 3.0, 0)]
+    assert [(v, d) for _p, v, d in JSONSource(L.X).iter_numeric_leaves()] == [(3.0, 0)]
+
+def test_xml_numeric_leaves_skip_comments():
+    src = XMLSource.sniff_and_make('<?xml version="1.0" encoding="utf-8"?><r><!-- c --><a>1,5</a><b>x</b><c>2</c><c>3</c></r>')
+    leaves = list(src.iter_numeric_leaves())
+    assert [(p.signature(), v, d) for p, v, d in leaves] == [
+        (("a", "a"), 1.5, 1), (("c[]", "c"), 2.0, 1), (("c[]", "c"), 3.0, 1)]
+    assert src.index_widths() == {"c": 1}
+
+def test_xml_stream_matches_tree():
+    doc = b'<r><a>1</a><i><x>1</x></i><i><x>2.5</x><y>n/a</y></i><z>5<q>6</q></z></r>'
+    tree = XMLSource.sniff_and_make(doc.decode())
+    stream = XMLStreamSource(io.BytesIO(doc))
+    def flat(src):
+        return [(p.tokens, v, d) for p, v, d in src.iter_numeric_leaves()]
+    assert flat(stream) == flat(tree)
+    assert stream.index_widths() == tree.index_widths()
+
+def test_jsonio_loads_accepts_stdlib_extensions():
+    assert jsonio.loads(b'{"a": [1, 2.5]}') == {"a": [1, 2.5]}
+    assert jsonio.loads(b'{"a": Infinity}') == {"a": float("inf")}
+
+def test_json_deep_nesting_has_no_recursion_limit():
+    doc = 1.5
+    for _ in range(5000):
+        doc = {"a": [doc]}
+    leaves = list(JSONSource(doc).iter_numeric_leaves())
+    assert len(leaves) == 1 and len(leaves[0][0].tokens) == 5000
+
+def test_scanned_tokens_are_shared():
+    src = JSONSource({"rows": [{"v": 1}, {"v": 2}], "n": [{"v": 3}]})
+    (p0, _, _), (p1, _, _), (p2, _, _) = src.iter_numeric_leaves()
+    assert p0.tokens[-1] is p1.tokens[-1] is p2.tokens[-1]
+    assert p0.tokens[0] == ArrIdx("rows", 0) and p0.tokens[0] is not p1.tokens[0]
+
+def test_root_kept_until_released():
+    srcs = [JSONSource.sniff_and_make(b'{"a": [1, 2.5]}'),
+            XMLSource.sniff_and_make('<r><a>1</a><a>2.5</a></r>')]
+    for src in srcs:
+        root = src.root
+        first = [(p.signature(), v, d) for p, v, d in src.iter_numeric_leaves()]
+        assert len(first) == 2 and src.index_widths() == {"a": 1}
+        assert src.root is root
+        src.release()
+        assert src.root is None
+        assert [(p.signature(), v, d) for p, v, d in src.iter_numeric_leaves()] == first
+        assert src.index_widths() == {"a": 1}
+
+def test_decimals_by_signature_aggregated_during_scan():
+    src = JSONSource({"r": [{"v": 1}, {"v": 2.25}], "w": 3.5})
+    assert src.decimals_by_signature() == {("r[]", "v"): 2, ("w",): 1}
+
+def test_scanned_signatures_match_recomputed():
+    docs = [JSONSource([[1.5], {"a": [{"b": 2}], "c": 3}]),
+            XMLSource.sniff_and_make('<r><i><x>1</x></i><i><x>2</x></i><y><z>3</z></y></r>')]
+    for src in docs:
+        for p, _v, _d in src.iter_numeric_leaves():
+            assert p.signature() == Path(p.tokens).signature()
+
+def test_count_decimals_exponent_forms():
+    assert [_count_decimals(v) for v in (5.0, 0.25, 1e-05, 2.5e-07, 1.5e-12, 1e-13, 1e+20, 1.5e+16)] == [1, 2, 5, 8, 12, 0, 0, 0]
+
+def test_equal_signatures_share_one_tuple():
+    (p0, _, _), (p1, _, _) = JSONSource({"r": [{"v": 1}, {"v": 2}]}).iter_numeric_leaves()
+    assert p0.signature() is p1.signature()
+    assert Path([ArrIdx("r", 5), ObjKey("v")]).signature() is p0.signature()
+
+def test_large_json_file_parsed_from_mapping(tmp_path, monkeypatch):
+    f = tmp_path / "r.json"
+    f.write_bytes(b' {"a": [1, 2.5], "b": NaN}')
+    monkeypatch.setattr(jsonio, "MMAP_MIN_SIZE", 0)
+    fa = FormatAdapter.from_path(f)
+    assert fa.kind == "json" and len(list(fa.source.iter_numeric_leaves())) == 3
+
+def test_xml_stream_matches_tree_across_detached_rows():
+    # rows are detached as they finish; later rows must still get their index
+    doc = b'<r>' + b'<i><x>1</x></i>' * 50 + b'</r>'
+    tree = XMLSource.sniff_and_make(doc.decode())
+    stream = XMLStreamSource(io.BytesIO(doc))
+    assert [(p.tokens, v, d) for p, v, d in stream.iter_numeric_leaves()] == \
+        [(p.tokens, v, d) for p, v, d in tree.iter_numeric_leaves()]
+    assert stream.index_widths() == tree.index_widths() == {"i": 2}
+
+def _run_isolated(script, *args, **env):
+    """Run ``script`` in a fresh interpreter, for checks that depend on
+    import-time state (parser choice) or fill process-wide caches."""
+    env = dict(os.environ, **env, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, "-c", script, *args], env=env, check=True)
+
+_XXE_CHECK = """
+import io, sys
+from loxvihgen.sources import XMLSource, XMLStreamSource
+dtd = '<?xml version="1.0"?><!DOCTYPE r [<!ENTITY n "5"><!ENTITY x SYSTEM "file://%s">]>' % sys.argv[1]
+makers = (lambda d: XMLSource.sniff_and_make(d), lambda d: XMLStreamSource(io.BytesIO(d.encode())))
+for make in makers:
+    leaves = {p.signature(): v for p, v, _ in make(dtd + '<r><a>&n;</a><b>1</b></r>').iter_numeric_leaves()}
+    assert leaves == {("a", "a"): 5.0, ("b", "b"): 1.0}, leaves
+    try:
+        make(dtd + '<r><a>&x;</a><b>1</b></r>')
+    except SyntaxError:
+        pass
+    else:
+        raise AssertionError("external entity accepted")
+"""
+
+def _has_lxml5():
+    try:
+        from lxml import etree
+    except ImportError:
+        return False
+    return etree.LXML_VERSION >= (5, 0)
+
+@pytest.mark.parametrize("no_lxml", [
+    pytest.param("", marks=pytest.mark.skipif(not _has_lxml5(), reason="needs lxml>=5")), "1"])
+def test_xml_internal_entities_expanded_external_rejected(tmp_path, no_lxml):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("42")
+    _run_isolated(_XXE_CHECK, str(secret), LOXVIHGEN_NO_LXML=no_lxml)
+
+_LIMITS_CHECK = """
+import io
+from loxvihgen.sources import XMLSource, XMLStreamSource
+docs = [(b"<a>" * n + b"1" + b"</a>" * n, n > 256) for n in (256, 257, 5000)]
+docs += [(b"<a>" + b"1" * n + b"</a>", n > 10_000_000) for n in (10_000_000, 10_000_001)]
+docs.append((("<a>" + "\u00e4" * 5_000_001 + "</a>").encode(), True))
+makers = (lambda d: XMLSource.sniff_and_make(d.decode()), lambda d: XMLStreamSource(io.BytesIO(d)))
+for doc, too_big in docs:
+    for make in makers:
+        try:
+            make(doc).index_widths()
+        except ValueError as e:
+            assert too_big and ("256 levels" in str(e) or "10000000 bytes" in str(e)), e
+        else:
+            assert not too_big
+"""
+
+@pytest.mark.parametrize("no_lxml", [
+    pytest.param("", marks=pytest.mark.skipif(not _has_lxml5(), reason="needs lxml>=5")), "1"])
+def test_xml_limits_same_with_either_parser(no_lxml):
+    _run_isolated(_LIMITS_CHECK, LOXVIHGEN_NO_LXML=no_lxml)
+
+_LXML4_CHECK = """
+import sys, types
+lxml, etree = types.ModuleType("lxml"), types.ModuleType("lxml.etree")
+etree.LXML_VERSION = (4, 9, 4, 0)
+def parser(**kw):
+    raise AssertionError("lxml 4 used")
+etree.XMLParser = etree.iterparse = parser
+lxml.etree = etree
+sys.modules.update({"lxml": lxml, "lxml.etree": etree})
+from loxvihgen import sources
+assert sources.ET.__name__ == "xml.etree.ElementTree", sources.ET
+"""
+
+def test_lxml_before_5_falls_back_to_stdlib():
+    _run_isolated(_LXML4_CHECK, LOXVIHGEN_NO_LXML="")
+
+_FULL_CACHE_CHECK = """
+from loxvihgen.core import ArrIdx, ObjKey, Path, arr_idx, obj_key, token_signature
+from loxvihgen.sources import JSONSource
+# far more distinct keys and signatures than the shared caches hold
+doc = {f"k{i}": [i, {f"v{i}": 1.5}] for i in range(10000)}
+leaves = list(JSONSource(doc).iter_numeric_leaves())
+assert len(leaves) == 20000
+assert leaves[-1][0].signature() == ("k9999[]", "v9999")
+assert leaves[-1][0].signature() == Path(leaves[-1][0].tokens).signature()
+assert obj_key("x") == obj_key("x") == ObjKey("x")
+assert arr_idx("x", 3) == arr_idx("x", 3) == ArrIdx("x", 3)
+assert token_signature(arr_idx("x", 3)) == ("x[]",) and token_signature(obj_key("x")) == ("x",)
+"""
+
+def test_tokens_stay_correct_with_full_caches():
+    _run_isolated(_FULL_CACHE_CHECK)
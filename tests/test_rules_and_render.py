@@ -1,7 +1,10 @@
+import html
+import io
 import json
 from pathlib import Path
-from loxvihgen.sources import FormatAdapter
-from loxvihgen.rules import Rules
+from loxvihgen.sources import FormatAdapter, JSONSource
+from loxvihgen.rules import Rules, UnitRule
+from loxvihgen.core import ObjKey, ArrIdx
 from loxvihgen.builders import TitleBuilder, VIHBuilder, JSONCheckStringBuilder
 from loxvihgen.renderer import ViHttpXmlRenderer
 
@@ -21,3 +24,44 @@ def test_full_pipeline_json(tmp_path: Path):
     assert all(c.unit == '<v.2>' for c in cmds)
     xml = ViHttpXmlRenderer().render(cmds, title='T', address_url='http://...', polling_time=1200, comment_json='')
     assert xml.count('<VirtualInHttpCmd') == 2
+
+
+def test_write_matches_render():
+    src = JSONSource({"a": [{"x": 1.5, "t&<": 2}] * 600})
+    tb = TitleBuilder(sep='.', prefix='', width_by_key=src.index_widths())
+    cmds = VIHBuilder(src, tb, Rules([]), JSONCheckStringBuilder()).build_commands()
+    args = dict(title='T "ü"', address_url='http://h/?a=1&b=2', polling_time=1200, comment_json='{"c":1}')
+    buf = io.BytesIO()
+    ViHttpXmlRenderer().write(buf, cmds, **args)
+    assert buf.getvalue() == ViHttpXmlRenderer().render(cmds, **args).encode('utf-8')
+
+
+def test_rules_longest_suffix_wins():
+    rules = Rules([
+        UnitRule(pattern="temp", tokens=("temp",), unit="°C", order=0),
+        UnitRule(pattern="temp.min", tokens=("temp", "min"), unit="<v.1> °C", order=1),
+        UnitRule(pattern="temp", tokens=("temp",), unit="K", order=2),
+    ])
+    assert rules.match_unit([ObjKey("current"), ObjKey("temp")]) == ("°C", False)
+    assert rules.match_unit([ArrIdx("daily", 3), ObjKey("temp"), ObjKey("min")]) == ("<v.1> °C", True)
+    assert rules.match_unit([ObjKey("min")]) is None
+
+
+def test_rules_do_not_match_across_dotted_keys():
+    rules = Rules([UnitRule(pattern="b.c", tokens=("b", "c"), unit="W", order=0)])
+    assert rules.match_unit([ObjKey("a"), ObjKey("b"), ObjKey("c")]) == ("W", False)
+    assert rules.match_unit([ObjKey("a"), ObjKey("b.c")]) is None
+
+
+def test_xml_attr_escape_matches_html_escape():
+    s = """a&b <c> "d" 'e' °C"""
+    assert ViHttpXmlRenderer._xml_attr_escape(s) == html.escape(s, quote=True)
+
+
+def test_unit_rules_distinguish_keys_sharing_a_signature():
+    rules = Rules([UnitRule(pattern="k", tokens=("k",), unit="AAA", order=0)])
+    for doc in ({"k[]": 1.5, "k": [2.5]}, {"k": [2.5], "k[]": 1.5}):
+        src = JSONSource(doc)
+        tb = TitleBuilder(sep='.', prefix='', width_by_key=src.index_widths())
+        cmds = VIHBuilder(src, tb, rules, JSONCheckStringBuilder()).build_commands()
+        assert {c.title: c.unit for c in cmds} == {'k[]': '<v.1>', 'k[0]': '<v.1> AAA'}